@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Startup-time benchmark of the fast subcommands of cli.py.
+
+Runs `cli.py status` and `cli.py token` against a generated state.json and
+cached token in a temporary directory, so neither AWS nor a login is required.
+Every subcommand is run with `python -X importtime` to check that none of the
+heavy dependencies are imported and that the total import time stays within
+the budget. The wall time of the whole process is checked as well.
+
+Exits with a non-zero status if a budget is exceeded.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+SUBCOMMANDS = [["status"], ["token"]]
+HEAVY_MODULES = ["boto3", "botocore", "jwt", "requests", "requests_oauthlib", "rich"]
+# budgets in milliseconds
+IMPORT_TIME_BUDGET = 50
+WALL_TIME_BUDGET = 100
+
+
+def write_fixtures(directory):
+    state = {
+        "region": "us-east-1",
+        "user_pool_id": "us-east-1_abcdef",
+        "api_url": "https://someid.execute-api.us-east-1.amazonaws.com/dev/hello",
+        "lambda_function_name": "EchoFunction",
+    }
+    token = {"access_token": "token", "expires_at": time.time() + 3600}
+    with open(os.path.join(directory, "state.json"), "w") as f:
+        json.dump(state, f)
+    with open(os.path.join(directory, "token_cache.json"), "w") as f:
+        json.dump(token, f)
+
+
+def parse_importtime(stderr):
+    """Return the imported top level modules and the total import time in ms."""
+    modules = set()
+    total_us = 0
+    for line in stderr.splitlines():
+        # import time:  self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, package = line[len("import time:") :].split("|")
+        total_us += int(self_us)
+        modules.add(package.strip().split(".")[0])
+    return modules, total_us / 1000
+
+
+def run(subcommand, directory):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", CLI, *subcommand],
+        cwd=directory,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    modules, import_ms = parse_importtime(result.stderr)
+    return wall_ms, import_ms, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--runs", type=int, default=5, help="Runs per subcommand, the best counts"
+    )
+    args = parser.parse_args(argv)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        write_fixtures(directory)
+        for subcommand in SUBCOMMANDS:
+            results = [run(subcommand, directory) for _ in range(args.runs)]
+            wall_ms = min(wall for wall, _, _ in results)
+            import_ms = min(imports for _, imports, _ in results)
+            heavy = sorted(set(HEAVY_MODULES) & results[0][2])
+
+            name = " ".join(subcommand)
+            print(
+                f"{name:<8} wall {wall_ms:6.1f} ms (budget {WALL_TIME_BUDGET} ms), "
+                f"imports {import_ms:5.1f} ms (budget {IMPORT_TIME_BUDGET} ms)"
+            )
+            if heavy:
+                print(f"{name:<8} imports heavy modules: {', '.join(heavy)}")
+            if heavy or wall_ms > WALL_TIME_BUDGET or import_ms > IMPORT_TIME_BUDGET:
+                failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+Single entry point for all scripts of this repository.
+
+    python cli.py create    # create.py, creates all AWS resources
+    python cli.py delete    # delete.py, deletes all AWS resources
+    python cli.py token     # prints a valid access token, logs in if required
+    python cli.py verify    # decodes and verifies the cached tokens
+    python cli.py status    # summary of state.json and the cached tokens
+    python cli.py layer     # layer.py, builds and publishes the lambda layer
+    python cli.py users ... # users.py, exports and diffs user pool users
+
+Only the standard library is imported at startup. boto3, jwt, requests_oauthlib
+and rich are imported by the subcommands that need them, which keeps `status`
+and `token` with a cached token fast. See bench_startup.py.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from token_cache import load_cached_token, token_is_valid
+
+
+def load_state():
+    try:
+        with open("state.json", "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        sys.exit("'state.json' not found, run 'python cli.py create' first.")
+
+
+def create(args):
+    import create
+
+    create.main()
+
+
+def delete(args):
+    import delete
+
+    delete.main()
+
+
+def token(args):
+    cached_token = load_cached_token()
+    if not args.login and token_is_valid(cached_token):
+        print(cached_token["access_token"])
+        return
+
+    import tokens
+
+    state = load_state()
+    new_token = None
+    if not args.login and cached_token and cached_token.get("refresh_token"):
+        try:
+            new_token = tokens.refresh(state, cached_token)
+        except Exception as e:
+            # e.g. an expired refresh token, fall back to logging in again
+            print(e, file=sys.stderr)
+    if new_token is None:
+        tokens.configure_logging()
+        # stdout only holds the token, e.g. for $(python cli.py token)
+        new_token = tokens.login(state, tokens.SCOPES, file=sys.stderr)
+    print(new_token["access_token"])
+
+
+def verify(args):
+    cached_token = load_cached_token()
+    if cached_token is None:
+        sys.exit("No cached token found, run 'python cli.py token' first.")
+
+    import jwt
+    import tokens
+    from rich import print
+
+    state = load_state()
+    valid = True
+    for name in ("id_token", "access_token"):
+        if name not in cached_token:
+            continue
+        try:
+            decoded_token = tokens.decode_token(state, cached_token[name])
+            tokens.verify_token(state, decoded_token)
+        except jwt.InvalidTokenError as e:
+            # e.g. an expired token, which status reports as expired
+            print(f"{name} is invalid: {e}")
+            valid = False
+            continue
+        print(f"{name} is valid")
+        print(decoded_token)
+    if not valid:
+        sys.exit(1)
+
+
+def status(args):
+    state = load_state()
+    for key in (
+        "region",
+        "user_pool_id",
+        "user_pool_auth_domain",
+        "terminal_app_client_id",
+        "api_url",
+        "lambda_function_name",
+        "lambda_layer_version_arn",
+    ):
+        print(f"{key + ':':<28}{state.get(key, '-')}")
+
+    cached_token = load_cached_token()
+    if cached_token is None:
+        token_status = "none"
+    elif token_is_valid(cached_token):
+        expires_in = int(cached_token["expires_at"] - time.time())
+        token_status = f"valid for {expires_in}s"
+    else:
+        token_status = "expired"
+    print(f"{'token:':<28}{token_status}")
+
+
+def layer(args):
+    import layer
+
+    layer.main()
+
+
+def users(argv):
+    import users
+
+    users.main(argv, prog="cli.py users")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Create, use and delete the secure serverless API."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("create", help="Create all AWS resources.").set_defaults(
+        func=create
+    )
+    subparsers.add_parser("delete", help="Delete all AWS resources.").set_defaults(
+        func=delete
+    )
+
+    token_parser = subparsers.add_parser(
+        "token", help="Print a valid access token, logging in if required."
+    )
+    token_parser.add_argument(
+        "--login",
+        action="store_true",
+        help="Log in again even if a valid token is cached",
+    )
+    token_parser.set_defaults(func=token)
+
+    subparsers.add_parser(
+        "verify", help="Decode and verify the cached tokens."
+    ).set_defaults(func=verify)
+    subparsers.add_parser(
+        "status", help="Show the created resources and the cached token."
+    ).set_defaults(func=status)
+    subparsers.add_parser(
+        "layer", help="Build and publish the Lambda layer."
+    ).set_defaults(func=layer)
+
+    # only listed here for the help, the arguments are parsed by users.py
+    subparsers.add_parser("users", help="Export and diff user pool users.")
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["users"]:
+        users(argv[1:])
+        return
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,41 @@
 #!/usr/bin/env python
 
-# make sure environment variables are loaded before boto3 is imported
-from dotenv import load_dotenv
-
-load_dotenv()
-
 import os
-import boto3
 import json
 import zipfile
 import io
 import time
 
-from rich import print
+import layer
+from layer import LAYER_NAME, build_layer, publish_layer
+
+# Clients are initialized by init_clients(), importing this module does no work
+cognito_client = None
+apigw_client = None
+lambda_client = None
+iam_client = None
+sts_client = None
+
+
+def init_clients():
+    global cognito_client, apigw_client, lambda_client, iam_client, sts_client, print
+    # make sure environment variables are loaded before boto3 is imported
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    import boto3
+    from rich import print
 
-# Initialize clients
-cognito_client = boto3.client("cognito-idp")
-apigw_client = boto3.client("apigatewayv2")
-lambda_client = boto3.client("lambda")
-iam_client = boto3.client("iam")
+    cognito_client = boto3.client("cognito-idp")
+    apigw_client = boto3.client("apigatewayv2")
+    lambda_client = boto3.client("lambda")
+    iam_client = boto3.client("iam")
+    sts_client = boto3.client("sts")
+    layer.init_clients()
 
 # State dictionary to store created resource IDs
+state = None
 
 
 def load_state_from_file():
@@ -148,6 +163,12 @@ def create_lambda_role():
     print(f"Lambda execution role created with ARN: '{state['lambda_role_arn']}'")
 
 
+def create_lambda_layer(zip_path):
+    layer_version_arn, layer_hash = publish_layer(state["lambda_layer_name"], zip_path)
+    state["lambda_layer_version_arn"] = layer_version_arn
+    state["lambda_layer_hash"] = layer_hash
+
+
 def create_lambda_function(role_arn):
     lambda_code = """
 def lambda_handler(event, context):
@@ -174,6 +195,8 @@ def lambda_handler(event, context):
         Handler="lambda_function.lambda_handler",
         Code={"ZipFile": zip_io.read()},
         Architectures=["arm64"],
+        # dependencies live in the layer, keeps the function package small
+        Layers=[state["lambda_layer_version_arn"]],
         Description="Lambda function for echoing hello world",
     )
     print(f"Lambda function created with name: '{state['lambda_function_name']}'")
@@ -185,7 +208,7 @@ def add_permission_for_apigw_to_invoke_lambda():
         StatementId=f"apigateway-{state['api_id']}",
         Action="lambda:InvokeFunction",
         Principal="apigateway.amazonaws.com",
-        SourceArn=f"arn:aws:execute-api:{state['region']}:{boto3.client('sts').get_caller_identity()['Account']}:{state['api_id']}/*/*",
+        SourceArn=f"arn:aws:execute-api:{state['region']}:{sts_client.get_caller_identity()['Account']}:{state['api_id']}/*/*",
     )
     print("Permission added to Lambda function for API Gateway to invoke it.")
 
@@ -194,7 +217,7 @@ def create_integration():
     response = apigw_client.create_integration(
         ApiId=state["api_id"],
         IntegrationType="AWS_PROXY",
-        IntegrationUri=f"arn:aws:lambda:{boto3.session.Session().region_name}:{boto3.client('sts').get_caller_identity()['Account']}:function:{state['lambda_function_name']}",
+        IntegrationUri=f"arn:aws:lambda:{state['region']}:{sts_client.get_caller_identity()['Account']}:function:{state['lambda_function_name']}",
         IntegrationMethod="GET",
         PayloadFormatVersion="2.0",
     )
@@ -259,9 +282,11 @@ def save_state_to_file():
     print("State saved to state.json")
 
 
-if __name__ == "__main__":
+def main():
+    global state
+    init_clients()
     state = {
-        "region": boto3.session.Session().region_name,
+        "region": cognito_client.meta.region_name,
         "user_pool_name": "HelloUserPool",
         "user_pool_jwt_issuer_url": "",
         "user_pool_username": "Testuser",
@@ -271,6 +296,7 @@ if __name__ == "__main__":
         "api_route_method": "GET",
         "lambda_function_name": "EchoFunction",
         "lambda_role_name": "APIGatewayLambdaRole",
+        "lambda_layer_name": LAYER_NAME,
         "api_stage_name": "dev",
         "api_scopes": [
             ("hello.read", "Allows read access to the hello API"),
@@ -284,6 +310,8 @@ if __name__ == "__main__":
         # "api_authorizer_id": "",
         # "api_integration_id": "",
         # "lambda_role_arn": "",
+        # "lambda_layer_version_arn": "",
+        # "lambda_layer_hash": "",
         # "user_pool_resource_server_id": "",
         # "terminal_app_client_id": "",
         # "user_pool_auth_domain": ""
@@ -303,6 +331,9 @@ if __name__ == "__main__":
             "Provide 'PASSWORD' and 'DOMAIN_PREFIX' environment variables."
         )
 
+    # purely local, fails before any AWS resource is created
+    layer_zip_path = build_layer()
+
     try:
         create_userpool()
         create_user_pool_authentication_domain(DOMAIN_PREFIX)
@@ -317,6 +348,7 @@ if __name__ == "__main__":
         # waiter on role creation does not work
         # small TODO: wait on availabiltiy of trust policy instead of sleep
         create_lambda_role()
+        create_lambda_layer(layer_zip_path)
         time.sleep(10)
 
         create_lambda_function(state["lambda_role_arn"])
@@ -331,3 +363,7 @@ if __name__ == "__main__":
         print(e)
 
     save_state_to_file()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,30 @@
 #!/usr/bin/env python
 
-# make sure environment variables are loaded before boto3 is imported
-from dotenv import load_dotenv
+import json
 
-load_dotenv()
+# Clients are initialized by init_clients(), importing this module does no work
+cognito_client = None
+apigw_client = None
+lambda_client = None
+iam_client = None
+logs_client = None
 
-import boto3
-import json
-from botocore.exceptions import ClientError
-from rich import print
 
-# Initialize clients
-cognito_client = boto3.client("cognito-idp")
-apigw_client = boto3.client("apigatewayv2")
-lambda_client = boto3.client("lambda")
-iam_client = boto3.client("iam")
-logs_client = boto3.client("logs")
+def init_clients():
+    global cognito_client, apigw_client, lambda_client, iam_client, logs_client, print
+    # make sure environment variables are loaded before boto3 is imported
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    import boto3
+    from rich import print
+
+    cognito_client = boto3.client("cognito-idp")
+    apigw_client = boto3.client("apigatewayv2")
+    lambda_client = boto3.client("lambda")
+    iam_client = boto3.client("iam")
+    logs_client = boto3.client("logs")
 
 
 # Load state from JSON file
@@ -24,12 +33,14 @@ def load_state_from_file():
         return json.load(f)
 
 
-state = load_state_from_file()
+state = None
 
 
 # Decorator function to handle ResourceNotFoundException
 def handle_resource_not_found(func):
     def wrapper(*args, **kwargs):
+        from botocore.exceptions import ClientError
+
         try:
             return func(*args, **kwargs)
         except ClientError as e:
@@ -138,6 +149,22 @@ def delete_lambda_role():
     print("Lambda execution role deleted")
 
 
+@handle_resource_not_found
+def delete_lambda_layer():
+    layer_name = state.get("lambda_layer_name")
+    if layer_name is None:
+        # state created before lambda layers were introduced
+        print("No lambda layer found in state, skipping")
+        return
+    paginator = lambda_client.get_paginator("list_layer_versions")
+    for page in paginator.paginate(LayerName=layer_name):
+        for layer_version in page["LayerVersions"]:
+            lambda_client.delete_layer_version(
+                LayerName=layer_name, VersionNumber=layer_version["Version"]
+            )
+            print(f"Layer '{layer_name}' version {layer_version['Version']} deleted")
+
+
 def delete_cloudwatch_logs():
     log_group_name = f"/aws/lambda/{state['lambda_function_name']}"
     paginator = logs_client.get_paginator("describe_log_streams")
@@ -175,11 +202,15 @@ def delete_route():
 
 
 # Execution of deletion functions
-if __name__ == "__main__":
+def main():
+    global state
+    init_clients()
+    state = load_state_from_file()
     delete_stage()
     delete_route()
     delete_integration()
     delete_lambda_function()
+    delete_lambda_layer()
     delete_authorizer()
     delete_api()
     delete_lambda_role()
@@ -189,3 +220,7 @@ if __name__ == "__main__":
     delete_cognito_auth_domain()
     delete_userpool()
     print("All resources deleted successfully")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+"""
+Build the Lambda layer containing the dependencies of the Lambda handler and
+publish it.
+
+The requirements in `requirements-layer.txt` are resolved from the wheels in the
+local `wheels` directory (see `make wheels`) for python3.11 on arm64, the runtime
+and architecture of the Lambda function. The built layer is zipped
+deterministically and cached in the `.layers` directory under a hash of its
+inputs, so a rebuild with unchanged dependencies does not invoke pip at all.
+
+A new layer version is only published if the sha256 of the layer zip differs
+from the one of the latest published version. The hash is stored in the
+description of every published layer version.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+# Client is initialized by init_clients(), importing this module does no work
+lambda_client = None
+
+LAYER_NAME = "HandlerDependencies"
+LAYER_REQUIREMENTS = "requirements-layer.txt"
+WHEELS_DIR = "wheels"
+CACHE_DIR = ".layers"
+PYTHON_VERSION = "3.11"
+RUNTIME = f"python{PYTHON_VERSION}"
+ARCHITECTURE = "arm64"
+PLATFORM = "manylinux2014_aarch64"
+# fixed timestamp of the zip entries, keeps the zip content hash stable
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def init_clients():
+    global lambda_client, print
+    # make sure environment variables are loaded before boto3 is imported
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    import boto3
+    from rich import print
+
+    lambda_client = boto3.client("lambda")
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def layer_cache_key(requirements=LAYER_REQUIREMENTS, wheels_dir=WHEELS_DIR):
+    """Hash everything that determines the content of the layer."""
+    digest = hashlib.sha256()
+    digest.update(f"{RUNTIME} {PLATFORM}\n".encode("utf-8"))
+    digest.update(f"{sha256_file(requirements)}\n".encode("utf-8"))
+    for name in sorted(os.listdir(wheels_dir)):
+        if name.endswith(".whl"):
+            path = os.path.join(wheels_dir, name)
+            digest.update(f"{name} {sha256_file(path)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def install_requirements(target, requirements, wheels_dir):
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+            "--quiet",
+            "--no-index",
+            "--find-links",
+            wheels_dir,
+            "--only-binary=:all:",
+            "--platform",
+            PLATFORM,
+            "--python-version",
+            PYTHON_VERSION,
+            "--implementation",
+            "cp",
+            "--no-compile",
+            "--target",
+            target,
+            "-r",
+            requirements,
+        ],
+        check=True,
+    )
+
+
+def zip_directory(directory, zip_path):
+    """Zip a directory with sorted entries and fixed timestamps."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d != "__pycache__"]
+        paths.extend(os.path.join(root, name) for name in files)
+
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted(paths):
+            info = zipfile.ZipInfo(
+                os.path.relpath(path, directory), date_time=ZIP_DATE_TIME
+            )
+            info.external_attr = (os.stat(path).st_mode & 0o777) << 16
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, "rb") as f:
+                zf.writestr(info, f.read())
+
+
+def build_layer(requirements=LAYER_REQUIREMENTS, wheels_dir=WHEELS_DIR):
+    """Return the path of the layer zip, building it only if it is not cached."""
+    if not os.path.isdir(wheels_dir):
+        raise RuntimeError(
+            f"Wheels directory '{wheels_dir}' not found, run 'make wheels'."
+        )
+
+    cache_key = layer_cache_key(requirements, wheels_dir)
+    zip_path = os.path.join(CACHE_DIR, f"{cache_key}.zip")
+    if os.path.exists(zip_path):
+        print(f"Using cached layer '{zip_path}'")
+        return zip_path
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory() as build_dir:
+        # lambda adds the python directory of a layer to the path
+        target = os.path.join(build_dir, "python")
+        install_requirements(target, requirements, wheels_dir)
+        # write to a temporary name first, an interrupted build must not be cached
+        zip_directory(build_dir, zip_path + ".tmp")
+    os.replace(zip_path + ".tmp", zip_path)
+    print(f"Layer built at '{zip_path}'")
+    return zip_path
+
+
+def latest_layer_version(layer_name):
+    response = lambda_client.list_layer_versions(
+        LayerName=layer_name, CompatibleArchitecture=ARCHITECTURE
+    )
+    # versions are listed newest first
+    versions = response["LayerVersions"]
+    return versions[0] if versions else None
+
+
+def publish_layer(layer_name, zip_path):
+    """Publish the layer zip unless the latest version has the same content hash."""
+    description = f"sha256:{sha256_file(zip_path)}"
+
+    latest = latest_layer_version(layer_name)
+    if latest is not None and latest.get("Description") == description:
+        print(f"Layer '{layer_name}' unchanged, using version {latest['Version']}")
+        return latest["LayerVersionArn"], description
+
+    with open(zip_path, "rb") as f:
+        response = lambda_client.publish_layer_version(
+            LayerName=layer_name,
+            Description=description,
+            Content={"ZipFile": f.read()},
+            CompatibleRuntimes=[RUNTIME],
+            CompatibleArchitectures=[ARCHITECTURE],
+        )
+    print(f"Layer '{layer_name}' published with version {response['Version']}")
+    return response["LayerVersionArn"], description
+
+
+def attach_layer(function_name, layer_version_arn):
+    lambda_client.update_function_configuration(
+        FunctionName=function_name, Layers=[layer_version_arn]
+    )
+    print(f"Lambda function '{function_name}' uses layer '{layer_version_arn}'")
+
+
+def load_state_from_file():
+    with open("state.json", "r") as f:
+        return json.load(f)
+
+
+def save_state_to_file(state):
+    with open("state.json", "w") as f:
+        json.dump(state, f, indent=4)
+    print("State saved to state.json")
+
+
+def main():
+    init_clients()
+    state = load_state_from_file()
+    zip_path = build_layer()
+    # state created before lambda layers were introduced has no layer name
+    layer_name = state.setdefault("lambda_layer_name", LAYER_NAME)
+    layer_version_arn, layer_hash = publish_layer(layer_name, zip_path)
+    if layer_version_arn != state.get("lambda_layer_version_arn"):
+        attach_layer(state["lambda_function_name"], layer_version_arn)
+        state["lambda_layer_version_arn"] = layer_version_arn
+        state["lambda_layer_hash"] = layer_hash
+        save_state_to_file(state)
+
+
+if __name__ == "__main__":
+    main()
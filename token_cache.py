@@ -0,0 +1,36 @@
+"""
+Cache of the tokens received by tokens.py.
+
+Only uses the standard library, so cli.py can return a cached access token
+without importing jwt, requests_oauthlib or rich.
+"""
+
+import json
+import os
+import time
+
+TOKEN_CACHE = "token_cache.json"
+# a cached access token is only used if it is valid for at least this many seconds
+TOKEN_EXPIRY_LEEWAY = 60
+
+
+def load_cached_token():
+    try:
+        with open(TOKEN_CACHE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_token_to_cache(token):
+    # tokens are credentials, only the owner may read them
+    fd = os.open(TOKEN_CACHE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(token, f, indent=4)
+
+
+def token_is_valid(token):
+    return (
+        token is not None
+        and token.get("expires_at", 0) > time.time() + TOKEN_EXPIRY_LEEWAY
+    )
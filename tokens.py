@@ -5,27 +5,44 @@ Sets a redirect uri to localhost:8083/callback.
 At the same time starts a simple webserver listening on localhost:8083/callback for the authorization code
 redirect from Cognito.
 
+The received tokens are cached in `token_cache.json`, so that `python cli.py token`
+can return a still valid access token without logging in again.
+
+Nothing happens at import time, requests, requests_oauthlib, jwt and rich are only
+imported by the functions that need them. Refreshing a token needs neither jwt
+nor rich.
 """
 
 import json
+import sys
 import webbrowser
 import logging
-import requests
-import jwt
-from rich import print
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 
-from requests_oauthlib import OAuth2Session
+from token_cache import save_token_to_cache
 
 
-logging.getLogger().handlers.clear()
-logger = logging.getLogger("requests_oauthlib.oauth2_session")
-handler = logging.StreamHandler()
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-handler.setFormatter(formatter)
-logger.addHandler(handler)
-logger.setLevel(logging.INFO)
+# Change for different results, None requests the scopes of the terminal app
+SCOPES = None  # Authorized, same as state["terminal_app_scopes"]
+# SCOPES = ["HelloAPI/hello.read", "HelloAPI/hello.write"]  # Authorized
+# SCOPES = ["HelloAPI/hello.read"]  # Authorized
+# SCOPES = ["openid", "email", "profile", "HelloAPI/hello.read"]  # Authorized
+# SCOPES = ["HelloAPI/hello.read"]  # Authorized, state["terminal_app_scopes"][-1]
+# SCOPES = ["email"]  # Authorized, state["terminal_app_scopes"][-2]
+# SCOPES = ["openid"]  # Unauthorized
+
+
+def configure_logging():
+    logging.getLogger().handlers.clear()
+    logger = logging.getLogger("requests_oauthlib.oauth2_session")
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
 
 
 def load_state_from_file():
@@ -33,37 +50,25 @@ def load_state_from_file():
         return json.load(f)
 
 
-state = load_state_from_file()
+def token_url(state):
+    return f"{state['user_pool_auth_domain']}/oauth2/token"
 
 
-# Change for different results
-SCOPES = state["terminal_app_scopes"]  # Authorized
-# SCOPES = ["HelloAPI/hello.read", "HelloAPI/hello.write"]  # Authorized
-# SCOPES = ["HelloAPI/hello.read"]  # Authorized
-# SCOPES = ["openid", "email", "profile", "HelloAPI/hello.read"]  # Authorized
-# SCOPES = [state["terminal_app_scopes"][-1]]  # Authorized
-# SCOPES = [state["terminal_app_scopes"][-2]]  # Authorized
-# SCOPES = ["openid"]  # Unauthorized
-
-# assumes localhost callback as first callback url
-callback_url = urlparse(state["terminal_app_callback_urls"][0])
-REDIRECT_URL_PORT = callback_url.port
-REDIRECT_URL_HOST = callback_url.hostname
+def oauth_session(state, scopes=None):
+    from requests_oauthlib import OAuth2Session
 
+    return OAuth2Session(
+        client_id=state["terminal_app_client_id"],
+        scope=scopes or state["terminal_app_scopes"],
+        # assumes localhost callback as first callback url
+        redirect_uri=state["terminal_app_callback_urls"][0],
+        pkce="S256",
+    )
 
-redirect_uri = state["terminal_app_callback_urls"][0]
-oauth = OAuth2Session(
-    client_id=state["terminal_app_client_id"],
-    scope=SCOPES,
-    redirect_uri=redirect_uri,
-    pkce="S256",
-)
-
-token_url = f"https://{state['user_pool_auth_domain_prefix']}.auth.us-east-1.amazoncognito.com/oauth2/token"
-client_id = state["terminal_app_client_id"]
 
+def decode_token(state, token):
+    import jwt
 
-def decode_token(token):
     jwk_url = f"{state['user_pool_jwt_issuer_url']}/.well-known/jwks.json"
     terminal_app_client_id = state["terminal_app_client_id"]
 
@@ -83,7 +88,9 @@ def decode_token(token):
     return decoded_token
 
 
-def verify_token(decoded_token):
+def verify_token(state, decoded_token):
+    import jwt
+
     terminal_app_client_id = state["terminal_app_client_id"]
     # Manually verify the client_id
     aud = (
@@ -92,19 +99,21 @@ def verify_token(decoded_token):
         else decoded_token["aud"]
     )
     if aud != terminal_app_client_id:
-        raise Exception("Invalid client_id or aud claim")
+        raise jwt.InvalidAudienceError("Invalid client_id or aud claim")
+
 
+def print_token(state, token):
+    from rich import print
 
-def print_token(token):
     if token is None:
         return
-    decoded_token = decode_token(token)
+    decoded_token = decode_token(state, token)
     print(token)
     print(decoded_token)
     try:
-        verify_token(decoded_token)
+        verify_token(state, decoded_token)
     except Exception as e:
-        print(e.message)
+        print(e)
 
 
 # Set up a temporary HTTP server to handle the authorization code callback
@@ -126,50 +135,12 @@ class CallbackHandler(BaseHTTPRequestHandler):
                     </body>
                     </html>
                 """)
-                authorization_code = query["code"][0]
-                print(f"Authorization code received: {authorization_code}\n")
-
-                print("Get id, access, and refresh tokens")
-                token = oauth.fetch_token(
-                    token_url,
-                    code=authorization_code,
-                    client_id=client_id,
-                    include_client_id=True,
-                    client_secret=None,
-                )
-                print(token)
-                access_token = token.get("access_token", None)
-                id_token = token.get("id_token", None)
-                refresh_token = token.get("refresh_token", None)
-
-                print()
-                print("Tokens")
-                print(80 * "-")
-                print("ID token")
-                print_token(id_token)
-                print()
-                print("Access token")
-                print_token(access_token)
-                print()
-                print("Refresh token")
-                print(refresh_token)
-                print()
-                print(80 * "-")
-                print(
-                    "Performing the following authorized request against the API Gateway."
-                )
-                print(
-                    f'curl -H "Authorization: Bearer {token["access_token"]}" {state["api_url"]}\n'
-                )
-                resp = requests.get(
-                    state["api_url"],
-                    headers={"Authorization": f"Bearer {token['access_token']}"},
-                )
-                print(
-                    f"Request received '{resp.status_code}' response with body: '{resp.text}'"
-                )
-
+                self.server.authorization_code = query["code"][0]
             else:
+                # e.g. ?error=access_denied when the login was cancelled
+                error = query.get("error", ["no authorization code"])[0]
+                description = query.get("error_description", [""])[0]
+                self.server.authorization_error = f"{error} {description}".strip()
                 self.send_response(400)
                 self.end_headers()
                 self.wfile.write(b"Authorization code not found in the callback URL.")
@@ -179,19 +150,99 @@ class CallbackHandler(BaseHTTPRequestHandler):
             self.wfile.write(b"Not Found")
 
 
-def main():
-    with HTTPServer((REDIRECT_URL_HOST, REDIRECT_URL_PORT), CallbackHandler) as httpd:
-        print(f"Serving at {redirect_uri}\n")
+def login(state, scopes=None, file=None):
+    """Log in at Cognito with the browser and return the received tokens.
+
+    Progress messages are printed to `file`, stdout by default.
+    """
+    oauth = oauth_session(state, scopes)
+    callback_url = urlparse(oauth.redirect_uri)
+    server_address = (callback_url.hostname, callback_url.port)
+
+    with HTTPServer(server_address, CallbackHandler) as httpd:
+        httpd.authorization_code = None
+        httpd.authorization_error = None
+        print(f"Serving at {oauth.redirect_uri}\n", file=file)
 
         # Generate authorization URL and open in the default web browser
         # /signup for sign up
         authorization_url = state["user_pool_auth_domain"] + "/login"
         auth_url, _ = oauth.authorization_url(authorization_url)
-        print(f"Opening login page to obtain an authorization token: {auth_url}\n")
+        print(
+            f"Opening login page to obtain an authorization token: {auth_url}\n",
+            file=file,
+        )
         webbrowser.open(auth_url)
 
-        # Step 7: Wait for the callback to receive the authorization code
-        httpd.handle_request()
+        # Wait for the callback to receive the authorization code
+        while httpd.authorization_code is None and httpd.authorization_error is None:
+            httpd.handle_request()
+
+    if httpd.authorization_error is not None:
+        raise RuntimeError(f"Login failed: {httpd.authorization_error}")
+    print(f"Authorization code received: {httpd.authorization_code}\n", file=file)
+    print("Get id, access, and refresh tokens", file=file)
+    token = oauth.fetch_token(
+        token_url(state),
+        code=httpd.authorization_code,
+        client_id=state["terminal_app_client_id"],
+        include_client_id=True,
+        client_secret=None,
+    )
+    save_token_to_cache(dict(token))
+    return token
+
+
+def refresh(state, token):
+    """Exchange the refresh token of a cached token for new id and access tokens."""
+    oauth = oauth_session(state)
+    new_token = oauth.refresh_token(
+        token_url(state),
+        refresh_token=token["refresh_token"],
+        client_id=state["terminal_app_client_id"],
+        include_client_id=True,
+    )
+    # cognito does not rotate the refresh token
+    new_token.setdefault("refresh_token", token["refresh_token"])
+    save_token_to_cache(dict(new_token))
+    return new_token
+
+
+def request_api(state, access_token):
+    import requests
+    from rich import print
+
+    print("Performing the following authorized request against the API Gateway.")
+    print(f'curl -H "Authorization: Bearer {access_token}" {state["api_url"]}\n')
+    resp = requests.get(
+        state["api_url"],
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    print(f"Request received '{resp.status_code}' response with body: '{resp.text}'")
+
+
+def main():
+    from rich import print
+
+    configure_logging()
+    state = load_state_from_file()
+    token = login(state, SCOPES)
+    print(token)
+
+    print()
+    print("Tokens")
+    print(80 * "-")
+    print("ID token")
+    print_token(state, token.get("id_token", None))
+    print()
+    print("Access token")
+    print_token(state, token.get("access_token", None))
+    print()
+    print("Refresh token")
+    print(token.get("refresh_token", None))
+    print()
+    print(80 * "-")
+    request_api(state, token["access_token"])
 
 
 if __name__ == "__main__":
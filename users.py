@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+"""
+Export the users of the Cognito user pool created in the create script and diff
+an export against a file of desired users.
+
+The export walks `list_users` page by page and writes every page straight to the
+output file, so memory stays constant regardless of the pool size. Large pools
+can be split into several `list_users` walks with `--prefix`, each walk only
+returning users whose filter attribute starts with the given prefix. The walks
+run in parallel and share one output file.
+
+The diff streams an export and compares it against a desired-users file (JSONL
+or CSV with at least a `Username` column). It writes a minimal plan containing
+one `create` line for every desired user missing in the pool and one `delete`
+line for every user in the pool that is not desired. Only the desired users are
+held in memory, the export is streamed. A desired user listed more than once in
+the export, e.g. in a concatenation of exports, never gets a delete entry.
+
+Only the export talks to AWS, boto3 is imported once an export is started.
+
+Examples:
+    python users.py export users.jsonl
+    python users.py export users.csv --prefix a --prefix b --prefix c --workers 2
+    python users.py diff users.jsonl desired.csv --output plan.jsonl
+"""
+
+# make sure environment variables are loaded before boto3 is imported
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import argparse
+import csv
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from rich import print
+
+# list_users returns at most 60 users per call
+PAGE_SIZE = 60
+# list_users has a low rate limit, parallel walks rely on adaptive retries
+MAX_ATTEMPTS = 10
+DEFAULT_WORKERS = 4
+CSV_FIELDS = ["Username", "UserStatus", "Enabled", "UserCreateDate"]
+
+
+def load_state_from_file():
+    with open("state.json", "r") as f:
+        return json.load(f)
+
+
+def file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".json"):
+        return "jsonl"
+    raise ValueError(f"Unsupported file format '{extension}', use .jsonl or .csv")
+
+
+def user_record(user):
+    record = {
+        "Username": user["Username"],
+        "UserStatus": user.get("UserStatus"),
+        "Enabled": user.get("Enabled"),
+        "UserCreateDate": (
+            user["UserCreateDate"].isoformat() if "UserCreateDate" in user else None
+        ),
+    }
+    for attribute in user.get("Attributes", []):
+        record[attribute["Name"]] = attribute["Value"]
+    return record
+
+
+class UserWriter:
+    """Thread safe writer appending user records to a JSONL or CSV file."""
+
+    def __init__(self, f, fmt, attributes):
+        self._f = f
+        self._lock = threading.Lock()
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.DictWriter(
+                f, fieldnames=CSV_FIELDS + attributes, extrasaction="ignore"
+            )
+            self._csv.writeheader()
+        self.count = 0
+
+    def write_page(self, records):
+        with self._lock:
+            if self._csv is not None:
+                self._csv.writerows(records)
+            else:
+                for record in records:
+                    self._f.write(json.dumps(record) + "\n")
+            self.count += len(records)
+
+
+def create_cognito_client():
+    import boto3
+    from botocore.config import Config
+
+    config = Config(retries={"mode": "adaptive", "max_attempts": MAX_ATTEMPTS})
+    return boto3.client("cognito-idp", config=config)
+
+
+def check_prefixes(prefixes):
+    """Reject prefixes that are invalid in a filter or whose walks would overlap."""
+    for prefix in prefixes:
+        if '"' in prefix or "\\" in prefix:
+            raise ValueError(f"Prefix '{prefix}' must not contain '\"' or '\\'")
+    for i, prefix in enumerate(prefixes):
+        for j, other in enumerate(prefixes):
+            if i != j and other.startswith(prefix):
+                raise ValueError(f"Prefixes '{prefix}' and '{other}' overlap")
+
+
+def list_users(cognito_client, user_pool_id, attributes, filter_expression=None):
+    """Yield pages of user records, one list_users call at a time."""
+    paginator = cognito_client.get_paginator("list_users")
+    kwargs = {
+        "UserPoolId": user_pool_id,
+        "PaginationConfig": {"PageSize": PAGE_SIZE},
+    }
+    if attributes:
+        kwargs["AttributesToGet"] = attributes
+    if filter_expression:
+        kwargs["Filter"] = filter_expression
+    for page in paginator.paginate(**kwargs):
+        yield [user_record(user) for user in page["Users"]]
+
+
+def export_users(
+    user_pool_id,
+    output,
+    attributes,
+    prefixes,
+    filter_attribute,
+    workers=DEFAULT_WORKERS,
+):
+    fmt = file_format(output)
+    if fmt == "csv" and not attributes:
+        # csv needs fixed columns
+        attributes = ["email"]
+    check_prefixes(prefixes)
+    # one filter per prefix, None walks the whole pool
+    filters = [f'{filter_attribute} ^= "{prefix}"' for prefix in prefixes] or [None]
+    cognito_client = create_cognito_client()
+
+    # write to a temporary name first, a failed walk must not leave a partial export
+    tmp_output = output + ".tmp"
+    try:
+        with open(tmp_output, "w", newline="") as f:
+            writer = UserWriter(f, fmt, attributes)
+
+            def export_filter(filter_expression):
+                for records in list_users(
+                    cognito_client, user_pool_id, attributes, filter_expression
+                ):
+                    writer.write_page(records)
+
+            with ThreadPoolExecutor(max_workers=min(workers, len(filters))) as executor:
+                # consume results to re-raise exceptions of the workers
+                list(executor.map(export_filter, filters))
+        os.replace(tmp_output, output)
+    finally:
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+
+    print(f"Exported {writer.count} users of User Pool '{user_pool_id}' to '{output}'")
+    return writer.count
+
+
+def read_users(path):
+    """Stream user records from a JSONL or CSV file."""
+    fmt = file_format(path)
+    with open(path, "r", newline="") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def diff_users(export_path, desired_path, output):
+    # only the desired users are held in memory, the export is streamed
+    desired = {record["Username"]: record for record in read_users(desired_path)}
+
+    # desired usernames found in the export, bounded by the desired users
+    matched = set()
+    creates = deletes = 0
+    with open(output, "w") as f:
+        for record in read_users(export_path):
+            username = record["Username"]
+            if username in matched:
+                continue
+            if username in desired:
+                matched.add(username)
+                continue
+            f.write(json.dumps({"action": "delete", "Username": username}) + "\n")
+            deletes += 1
+        # whatever was not found in the export has to be created
+        for username, record in desired.items():
+            if username not in matched:
+                f.write(json.dumps({"action": "create", **record}) + "\n")
+                creates += 1
+
+    print(f"Plan written to '{output}': {creates} users to create, {deletes} to delete")
+    return creates, deletes
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Export and diff Cognito users."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export users to a file.")
+    export_parser.add_argument("output", help="Output file (.jsonl or .csv)")
+    export_parser.add_argument(
+        "--user-pool-id", help="Defaults to the user pool id in state.json"
+    )
+    export_parser.add_argument(
+        "--attribute",
+        dest="attributes",
+        action="append",
+        default=[],
+        help="User attribute to export, can be repeated "
+        "(default: all attributes for .jsonl, email for .csv)",
+    )
+    export_parser.add_argument(
+        "--prefix",
+        dest="prefixes",
+        action="append",
+        default=[],
+        help="Export users whose filter attribute starts with the prefix, "
+        "can be repeated to export several prefixes in parallel",
+    )
+    export_parser.add_argument(
+        "--filter-attribute",
+        default="username",
+        help="Attribute the prefixes are matched against (default: username)",
+    )
+    export_parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=DEFAULT_WORKERS,
+        help="Maximum number of prefixes exported in parallel "
+        f"(default: {DEFAULT_WORKERS})",
+    )
+
+    diff_parser = subparsers.add_parser(
+        "diff", help="Diff an export against desired users."
+    )
+    diff_parser.add_argument("export", help="Exported users (.jsonl or .csv)")
+    diff_parser.add_argument("desired", help="Desired users (.jsonl or .csv)")
+    diff_parser.add_argument(
+        "--output", default="plan.jsonl", help="Plan file (default: plan.jsonl)"
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        user_pool_id = args.user_pool_id
+        if user_pool_id is None:
+            try:
+                user_pool_id = load_state_from_file()["user_pool_id"]
+            except FileNotFoundError:
+                export_parser.error(
+                    "'state.json' not found, pass --user-pool-id or "
+                    "run 'python cli.py create' first."
+                )
+        try:
+            export_users(
+                user_pool_id,
+                args.output,
+                args.attributes,
+                args.prefixes,
+                args.filter_attribute,
+                args.workers,
+            )
+        except ValueError as e:
+            export_parser.error(str(e))
+    elif args.command == "diff":
+        diff_users(args.export, args.desired, args.output)
+
+
+if __name__ == "__main__":
+    main()